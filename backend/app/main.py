@@ -3,34 +3,42 @@
 FastAPI backend for Smart Library
 - /healthz: liveness probe
 - /respond: SSE endpoint that streams Assistant output using OpenAI Responses API
-  with RAG context (Chroma). Tool-calling este ocolit temporar: selectăm titlul
-  în backend și injectăm rezumatul în pasul de streaming.
+  with RAG context (Chroma). Tool-calling este ocolit temporar: modelul alege
+  titlul și scrie răspunsul într-un singur apel de streaming, cu rezumatele
+  candidaților injectate în prompt.
 
 Env (.env la rădăcină recomandat):
   OPENAI_API_KEY=sk-...
   OPENAI_MODEL=gpt-4.1-nano
   EMBEDDING_MODEL=text-embedding-3-small
-  CHROMA_DIR=backend/app/data/vector_store
+  CHROMA_DIR=app/data/vector_store   (relativ la backend/)
+  HNSW_SEARCH_EF=40
   CORS_ORIGINS=http://localhost:5173,http://127.0.0.1:5173
 """
 
 from __future__ import annotations
 
+import asyncio
 import json
 import os
-from typing import AsyncIterator, Dict, List, Optional
+import string
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse, StreamingResponse
-from openai import OpenAI
-from .moderation import is_offensive
+from fastapi.responses import PlainTextResponse
+from openai import AsyncOpenAI
+from sse_starlette.sse import EventSourceResponse, ServerSentEvent
 
-from .rag import init_store, retrieve
-from .app_types import ChatRequest, FinalResponse  
+# înaintea importurilor locale: rag.py citește CHROMA_DIR / HNSW_SEARCH_EF la import
 load_dotenv()
 
+from .moderation import is_offensive
+from .rag import BOOKS_JSON, get_openai, init_store, retrieve
+from .app_types import ChatRequest, FinalResponse  
+
 # -----------------------------
 # App & Config
 # -----------------------------
@@ -59,126 +67,305 @@ app.add_middleware(
 # Helpers (SSE)
 # -----------------------------
 
+SSE_PING_SECONDS = 15
+# Clientul din frontend desparte frame-urile după '\n\n' (nu '\r\n\r\n', implicitul sse-starlette).
+SSE_SEP = "\n"
+# Delta-urile sosite într-o fereastră scurtă pleacă într-un singur frame 'token'.
+TOKEN_FLUSH_SECONDS = 0.02
+TOKEN_BATCH_MAX = 16
+
+
+# Frame-uri pre-encodate: pe calea per-token doar concatenăm bytes.
+_TOKEN_PREFIX = b"event: token\ndata: "
+_FINAL_PREFIX = b"event: final\ndata: "
+_ERROR_PREFIX = b"event: error\ndata: "
+_SUFFIX = b"\n\n"
+
+
+def _sse_token(delta: str) -> bytes:
+    if "\n" in delta or "\r" in delta:
+        # text pe mai multe linii: câte o linie 'data:' pentru fiecare
+        return ServerSentEvent(data=delta, event="token", sep=SSE_SEP).encode()
+    return _TOKEN_PREFIX + delta.encode("utf-8") + _SUFFIX
+
+
+def _sse_final(payload: Dict) -> bytes:
+    # json.dumps escapează newline-urile, deci payload-ul încape pe o linie
+    return _FINAL_PREFIX + json.dumps(payload).encode("utf-8") + _SUFFIX
+
 
-def _sse(data: str, event: Optional[str] = None) -> bytes:
+def _sse_error(message: str) -> bytes:
+    return _ERROR_PREFIX + json.dumps({"error": message}).encode("utf-8") + _SUFFIX
+
+
+def _event_source(events: AsyncIterator[bytes]) -> EventSourceResponse:
     """
-    Construiește un frame SSE. Dacă 'event' e prezent, include linia 'event:'.
+    Răspuns SSE cu keep-alive (ping) și headerele anti-buffering pentru proxy-uri.
     """
-    payload = f"event: {event}\n" if event else ""
-    payload += f"data: {data}\n\n"
-    return payload.encode("utf-8")
+    return EventSourceResponse(events, ping=SSE_PING_SECONDS, sep=SSE_SEP)
 
 
 # -----------------------------
 # Responses helpers (fără tool-calling)
 # -----------------------------
 
-def _select_title(message: str, context_items: List[Dict]) -> str:
+@dataclass
+class PreparedContext:
+    """Contextul RAG al unei cereri, pregătit o singură dată în respond()."""
+    items: List[Dict]
+    titles: List[str]
+    rag_block: str
+    summaries_by_title: Dict[str, str]
+
+
+def _fmt_item(item: Dict) -> str:
+    t = str(item.get("title", "") or "")
+    authors = item.get("authors") or ""
+    # în metadatele Chroma autorii sunt deja un string "A, B"
+    a = authors if isinstance(authors, str) else ", ".join(authors)
+    s = str(item.get("summary", "") or "")
+    return f"Titlu: {t}\nAutori: {a}\nRezumat scurt: {s[:350]}..."
+
+
+def _prepare_context(context_items: List[Dict], summaries: Dict[str, str]) -> PreparedContext:
+    titles = [t for t in (str(x.get("title") or "").strip() for x in context_items) if t]
+    return PreparedContext(
+        items=context_items,
+        titles=titles,
+        rag_block="\n\n".join(_fmt_item(x) for x in context_items) if context_items else "—",
+        summaries_by_title={t: summaries.get(t, "") for t in titles},
+    )
+
+
+def _parse_title_line(line: str) -> Optional[str]:
     """
-    Pas scurt non-stream: cere modelului să aleagă UN titlu din context.
-    Răspuns dorit: {"title":"..."} (strict JSON).
-    Dacă eșuează, întoarce primul titlu din context sau "".
+    Interpretează o linie ca preambul {"title":"..."}.
+    Întoarce titlul scris de model (nerezolvat) sau None dacă linia nu e preambul.
     """
-    titles = [str(x.get("title", "")).strip() for x in context_items if x.get("title")]
-    titles = [t for t in titles if t]
-    if not titles:
-        return ""
+    try:
+        data = json.loads(line.strip())
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or "title" not in data:
+        return None
+    return str(data["title"] or "").strip()
 
-    client = OpenAI()
 
-    system = (
-        "Alege EXACT UN titlu din lista dată. Răspunde STRICT ca JSON valid pe o singură linie: "
-        '{"title":"..."} Fără backticks, fără explicații.'
-    )
-    user = f"Cerere: {message}\nTitluri candidate: " + "; ".join(titles)
+def _match_title(chosen: str, titles: List[str]) -> Optional[str]:
+    """Candidatul egal cu `chosen` ignorând majusculele (ca _norm din tools), altfel None."""
+    key = chosen.strip().casefold()
+    return next((t for t in titles if t.strip().casefold() == key), None) if key else None
 
-    resp = client.responses.create(
-        model=OPENAI_MODEL,
-        input=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    )
 
-    text = (resp.output_text or "").strip()
-    try:
-        data = json.loads(text)
-        chosen = str(data.get("title", "")).strip()
-        return chosen if chosen in titles else (titles[0] if titles else "")
-    except Exception:
-        return titles[0] if titles else ""
+def _is_fence(line: str) -> bool:
+    return line.lstrip().startswith("```")
 
 
-async def _stream_final_with_summary(
-    message: str, context_items: List[Dict], title: str
-) -> AsyncIterator[bytes]:
+def _split_preamble(
+    head: str, titles: List[str], done: bool = False
+) -> Optional[Tuple[Optional[str], str]]:
     """
-    Pas de streaming: trimite către model cererea + titlul ales + rezumatul local
-    (fără tool-calling). Streamuiește textul ca 'token' și la final emite 'final'
-    cu payload JSON (FinalResponse).
+    Separă preambulul {"title":"..."} de textul pentru utilizator, sărind peste
+    liniile goale și gardurile ``` din jurul lui. Întoarce (titlu, rest) sau
+    None cât timp linia JSON (și gardul de închidere, dacă e încadrată) n-a sosit
+    complet; cu done=True decide pe ce există. Titlul e None dacă nu e printre
+    candidați. Fără preambul: (None, head).
     """
-    from .tools import get_summary_by_title 
-    summary = get_summary_by_title(title) if title else ""
-
-    client = OpenAI()
-
-    system = (
+    lines = head.split("\n")
+    # ultima bucată e o linie încă incompletă cât timp streamul continuă
+    n_full = len(lines) if done else len(lines) - 1
+    i, fenced = 0, False
+    while i < n_full and (not lines[i].strip() or _is_fence(lines[i])):
+        fenced = fenced or _is_fence(lines[i])
+        i += 1
+    if i >= n_full:
+        return (None, head) if done else None
+    chosen = _parse_title_line(lines[i])
+    if chosen is None:
+        return None, head
+    # linia e preambul chiar dacă titlul nu e un candidat: nu ajunge la utilizator
+    title = _match_title(chosen, titles)
+    i += 1
+    while i < n_full and not lines[i].strip():
+        i += 1
+    if fenced:
+        if i >= n_full:
+            if not done:
+                return None
+        elif _is_fence(lines[i]):
+            i += 1
+    return title, "\n".join(lines[i:]).lstrip("\n")
+
+
+# Părțile statice ale promptului se construiesc o singură dată, la import.
+_FINAL_SYSTEM_MSG = {
+    "role": "system",
+    "content": (
         "Ești „Bibliotecarul Asistent”. Recomandă concis O SINGURĂ carte și explică pe scurt „De ce”. "
         "Apoi inserează rezumatul complet furnizat (nu inventa). Rămâi în română, prietenos și clar."
-    )
-    def _fmt(item: Dict) -> str:
-        t = str(item.get("title", "") or "")
-        a = ", ".join(item.get("authors", []) or [])
-        s = str(item.get("summary", "") or "")
-        return f"Titlu: {t}\nAutori: {a}\nRezumat scurt: {s[:350]}..."
-
-    rag_block = "\n\n".join(_fmt(x) for x in context_items) if context_items else "—"
-    user = (
-        f"Cerere utilizator: {message}\n\n"
-        f"Titlu ales: {title or 'N/A'}\n\n"
-        f"CONTEXT (din RAG, pentru orientare – nu inventa altele):\n{rag_block}\n\n"
-        f"Rezumat complet pentru titlul ales (din sursă locală):\n{summary}\n\n"
-        "Structură răspuns:\n"
-        "1) O propoziție cu recomandarea (doar un titlu).\n"
-        "2) De ce se potrivește (2–3 fraze).\n"
-        "3) Rezumatul complet (exact cum e furnizat mai sus)."
-    )
+    ),
+}
+
+# Titlul nu e decis încă: modelul îl alege și îl întoarce pe prima linie.
+_CHOOSE_USER_TMPL = string.Template(
+    "Cerere utilizator: $msg\n\n"
+    "Titluri candidate (alege EXACT UNUL): $titles\n\n"
+    "CONTEXT (din RAG, pentru orientare – nu inventa altele):\n$rag\n\n"
+    "Rezumate complete pentru fiecare titlu candidat (din sursă locală):\n$summaries\n\n"
+    "Structură răspuns:\n"
+    'Prima linie: {"title":"..."} (JSON valid, titlul ales exact ca în listă, fără backticks). '
+    "Apoi textul uman:\n"
+    "1) O propoziție cu recomandarea (doar un titlu).\n"
+    "2) De ce se potrivește (2–3 fraze).\n"
+    "3) Rezumatul complet al titlului ales (exact cum e furnizat mai sus)."
+)
+
+# Titlul e deja decis în backend: fără preambul JSON.
+_FIXED_USER_TMPL = string.Template(
+    "Cerere utilizator: $msg\n\n"
+    "Titlu ales: $title\n\n"
+    "CONTEXT (din RAG, pentru orientare – nu inventa altele):\n$rag\n\n"
+    "Rezumat complet pentru titlul ales (din sursă locală):\n$summary\n\n"
+    "Structură răspuns:\n"
+    "1) O propoziție cu recomandarea (doar un titlu).\n"
+    "2) De ce se potrivește (2–3 fraze).\n"
+    "3) Rezumatul complet (exact cum e furnizat mai sus)."
+)
+
+
+# Primul rezultat câștigă fără model dacă e aproape de cerere și clar înaintea
+# celui de-al doilea (distanțe cosinus).
+CLEAR_WINNER_MAX_DISTANCE = 0.30
+CLEAR_WINNER_MIN_GAP = 0.08
+
+
+def _pick_title_locally(ctx: PreparedContext) -> Optional[str]:
+    """
+    Decide titlul fără model când alegerea e trivială: cel mult un candidat,
+    sau un prim rezultat clar mai bun decât următorul.
+    Întoarce None când trebuie să aleagă modelul.
+    """
+    if len(ctx.titles) <= 1:
+        return ctx.titles[0] if ctx.titles else ""
+    first, second = ctx.items[0], ctx.items[1]
+    top = str(first.get("title") or "").strip()
+    d0, d1 = first.get("distance"), second.get("distance")
+    if top and d0 is not None and d1 is not None:
+        if d0 < CLEAR_WINNER_MAX_DISTANCE and d1 - d0 > CLEAR_WINNER_MIN_GAP:
+            return top
+    return None
+
 
-    with client.responses.stream(
+async def _stream_final_with_summary(
+    client: AsyncOpenAI, message: str, ctx: PreparedContext, title: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """
+    Un singur apel de streaming. Dacă 'title' e None, modelul alege titlul din
+    candidați și îl scrie pe prima linie ca {"title":"..."} (nu o trimitem la
+    client); altfel primește direct titlul ales. Textul se streamuiește ca
+    'token', iar la final se emite 'final' cu payload JSON (FinalResponse).
+    """
+    titles = ctx.titles
+    summaries = ctx.summaries_by_title
+
+    if title is None:
+        summaries_block = "\n\n".join(f"[{t}]\n{s}" for t, s in summaries.items()) or "—"
+        user = _CHOOSE_USER_TMPL.substitute(
+            msg=message,
+            titles="; ".join(titles) or "N/A",
+            rag=ctx.rag_block,
+            summaries=summaries_block,
+        )
+    else:
+        user = _FIXED_USER_TMPL.substitute(
+            msg=message,
+            title=title or "N/A",
+            rag=ctx.rag_block,
+            summary=summaries.get(title, ""),
+        )
+
+    head = ""
+    head_done = title is not None
+    loop = asyncio.get_running_loop()
+    buf: List[str] = []
+    last_flush = loop.time()
+
+    async with client.responses.stream(
         model=OPENAI_MODEL,
-        input=[{"role": "system", "content": system}, {"role": "user", "content": user}],
+        input=[_FINAL_SYSTEM_MSG, {"role": "user", "content": user}],
     ) as stream:
-        for event in stream:
-            if event.type == "response.output_text.delta":
-                yield _sse(event.delta, event="token")
-
-    final_payload = FinalResponse(
-        final=True,
-        recommendation={"title": title},
-        summary=summary or None,
-    ).model_dump()
-    yield _sse(json.dumps(final_payload), event="final")
+        async for event in stream:
+            if event.type != "response.output_text.delta":
+                continue
+            if head_done:
+                buf.append(event.delta)
+                if len(buf) >= TOKEN_BATCH_MAX or loop.time() - last_flush >= TOKEN_FLUSH_SECONDS:
+                    yield _sse_token("".join(buf))
+                    buf.clear()
+                    last_flush = loop.time()
+                continue
+            head += event.delta
+            split = _split_preamble(head, titles)
+            if split is None:
+                continue
+            head_done = True
+            title, rest = split
+            if rest:
+                buf.append(rest)
+
+    if not head_done and head:
+        title, rest = _split_preamble(head, titles, done=True)
+        if rest:
+            buf.append(rest)
+    if buf:
+        yield _sse_token("".join(buf))
+
+    # Fără titlu valid nu trimitem o recomandare care poate contrazice textul.
+    if title:
+        final_payload = FinalResponse(
+            final=True,
+            recommendation={"title": title},
+            summary=summaries.get(title) or None,
+        ).model_dump()
+    else:
+        final_payload = FinalResponse(final=True).model_dump()
+    yield _sse_final(final_payload)
 
 async def _stream_policy_reply() -> AsyncIterator[bytes]:
     msg = ("Aș vrea să păstrăm conversația politică și respectuoasă. "
            "Poți reformula mesajul fără termeni ofensatori?")
-    yield _sse(msg, event="token")
+    yield _sse_token(msg)
     final_payload = FinalResponse(final=True).model_dump()
-    yield _sse(json.dumps(final_payload), event="final")
+    yield _sse_final(final_payload)
 
 # -----------------------------
 # Lifecycle
 # -----------------------------
 
 @app.on_event("startup")
-def _on_startup():
+async def _on_startup():
+    app.state.openai = get_openai()
+    app.state.summaries = {}
+    try:
+        with open(BOOKS_JSON, "r", encoding="utf-8") as f:
+            app.state.summaries = {
+                str(b.get("title", "")).strip(): str(b.get("summary") or "").strip()
+                for b in json.load(f)
+            }
+    except Exception as e:
+        print(f"[startup] summaries warning: {e}")
     try:
-        added, skipped = init_store(force=False)
+        added, skipped = await init_store(force=False)
         print(f"[startup] Chroma ready. added={added}, skipped={skipped}")
     except Exception as e:
         print(f"[startup] init_store warning: {e}")
 
 
+@app.on_event("shutdown")
+async def _on_shutdown():
+    await app.state.openai.close()
+
+
 # -----------------------------
 # Routes
 # -----------------------------
@@ -204,24 +391,23 @@ async def respond(payload: ChatRequest):
 
     bad = is_offensive(message)
     if bad:
-        async def event_generator_policy():
+        async def event_generator_policy() -> AsyncIterator[bytes]:
             try:
                 async for chunk in _stream_policy_reply():
                     yield chunk
             except Exception as e:
-                yield _sse(json.dumps({"error": str(e)}), event="error")
-        return StreamingResponse(event_generator_policy(), media_type="text/event-stream")
-
-    context_items = retrieve(message, k=3)
+                yield _sse_error(str(e))
+        return _event_source(event_generator_policy())
 
-    title = _select_title(message, context_items)
+    context_items = await retrieve(message, k=3)
+    ctx = _prepare_context(context_items, app.state.summaries)
+    title = _pick_title_locally(ctx)
 
     async def event_generator() -> AsyncIterator[bytes]:
         try:
-            async for chunk in _stream_final_with_summary(message, context_items, title):
+            async for chunk in _stream_final_with_summary(app.state.openai, message, ctx, title):
                 yield chunk
         except Exception as e:
-            err = {"error": str(e)}
-            yield _sse(json.dumps(err), event="error")
+            yield _sse_error(str(e))
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return _event_source(event_generator())
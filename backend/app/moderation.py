@@ -1,6 +1,16 @@
 from __future__ import annotations
 import re
-from typing import Optional
+from typing import List, Optional
+
+try:
+    import hyperscan
+except ImportError:  # native lib missing (e.g. non-x86 dev machines)
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 OFFENSIVE_PATTERNS = [
     r"\bidiot\w*\b",
@@ -40,7 +50,82 @@ OFFENSIVE_PATTERNS = [
     r"\bbastard\w*\b",
 ]
 
-_COMPILED = re.compile("|".join(OFFENSIVE_PATTERNS), re.IGNORECASE | re.UNICODE)
+# Pattern-urile sunt deja lowercase, iar textul e casefold-uit o singură dată în
+# is_offensive — fără IGNORECASE, motorul nu mai face case-folding la fiecare caracter.
+_COMPILED = re.compile("|".join(OFFENSIVE_PATTERNS), re.UNICODE)
+
+
+# Fiecare pattern e de forma \b<rădăcină>\w*\b: rădăcinile sunt literali.
+_STEMS = [p[len(r"\b"):-len(r"\w*\b")].replace("\\", "").lower() for p in OFFENSIVE_PATTERNS]
+_MAX_STEM_LEN = max(len(s) for s in _STEMS)
+
+
+def _build_hs_db():
+    """
+    Compilează rădăcinile (literali, fără \\b) într-o singură bază Hyperscan,
+    scanată într-o singură trecere indiferent de numărul de termeni. E un
+    prefiltru: orice hit al unui pattern conține rădăcina, iar granița de cuvânt
+    o confirmă _COMPILED. (\\b nu e suportat în modul UCP, iar \\b ASCII ratează
+    rădăcinile care încep cu diacritice, ex. „țigan”.)
+    """
+    if hyperscan is None:
+        return None
+    n = len(_STEMS)
+    flags = hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_SINGLEMATCH
+    db = hyperscan.Database()
+    try:
+        db.compile(
+            expressions=[re.escape(s).encode("utf-8") for s in _STEMS],
+            ids=list(range(n)),
+            flags=[flags] * n,
+        )
+    except hyperscan.error:
+        return None
+    return db
+
+
+_HS_DB = _build_hs_db()
+
+
+def _hs_has_match(text: str) -> bool:
+    hits: List[int] = []
+
+    def _on_match(pattern_id, start, end, flags, context):
+        hits.append(pattern_id)
+        return True  # oprește scanarea la primul hit
+
+    try:
+        _HS_DB.scan(text.encode("utf-8"), match_event_handler=_on_match)
+    except hyperscan.ScanTerminated:  # așa semnalează python-hyperscan oprirea cerută
+        pass
+    return bool(hits)
+
+
+def _build_automaton():
+    """
+    Automat Aho-Corasick peste rădăcini — fallback când Hyperscan lipsește.
+    O singură trecere O(n) prin text, indiferent de numărul de termeni.
+    """
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for stem in _STEMS:
+        automaton.add_word(stem, stem)
+    automaton.make_automaton()
+    return automaton
+
+
+_AUTOMATON = _build_automaton() if _HS_DB is None else None
+
+
+def _ac_search(lowered: str) -> Optional[str]:
+    for end, _stem in _AUTOMATON.iter(lowered):
+        # Orice potrivire începe cel mult la _MAX_STEM_LEN - 1 caractere înaintea
+        # primului hit; regex-ul confirmă granița de cuvânt pe fereastra rămasă.
+        m = _COMPILED.search(lowered, max(0, end - _MAX_STEM_LEN + 1))
+        return m.group(0) if m else None
+    return None
+
 
 def is_offensive(text: str) -> Optional[str]:
     """
@@ -49,5 +134,12 @@ def is_offensive(text: str) -> Optional[str]:
     """
     if not text:
         return None
+    text = text.casefold()
+    # Hyperscan decide rapid dacă apare vreo rădăcină; regex-ul rulează doar pe
+    # mesajele (rare) care chiar conțin una, ca să confirme și să extragă cuvântul.
+    if _HS_DB is not None and not _hs_has_match(text):
+        return None
+    if _AUTOMATON is not None:
+        return _ac_search(text)
     m = _COMPILED.search(text)
     return m.group(0) if m else None
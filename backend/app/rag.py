@@ -12,12 +12,15 @@ What this module does:
 
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import pathlib
-from typing import Any, Dict, List, Tuple
+import random
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAioHttpClient
 import chromadb
 
 # -----------------------------
@@ -27,20 +30,40 @@ import chromadb
 ROOT_DIR = pathlib.Path(__file__).resolve().parents[1]  
 DATA_DIR = pathlib.Path(__file__).parent / "data"
 BOOKS_JSON = DATA_DIR / "book_summaries.json"
-CHROMA_DIR = pathlib.Path(os.getenv("CHROMA_DIR", str(DATA_DIR / "vector_store")))
+# A relative CHROMA_DIR is taken from ROOT_DIR (backend/), not the cwd, so the
+# server and setup_db open the same store wherever they are started from.
+CHROMA_DIR = ROOT_DIR / os.getenv("CHROMA_DIR", str(DATA_DIR / "vector_store"))
 COLLECTION_NAME = "books"
 
+# HNSW graph params. space / M / construction_ef are baked in when the index is
+# built (changing them needs `python -m app.setup_db --rebuild`); HNSW_SEARCH_EF
+# trades recall for query latency.
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "40"))
+HNSW_METADATA: Dict[str, Any] = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": HNSW_SEARCH_EF,
+}
+_HNSW_BUILD_KEYS = ("hnsw:space", "hnsw:M", "hnsw:construction_ef")
+
 CHROMA_DIR.mkdir(parents=True, exist_ok=True)
 
-_openai_client: OpenAI | None = None
+_openai_client: AsyncOpenAI | None = None
 _chroma_client: chromadb.PersistentClient | None = None
 _collection: chromadb.api.models.Collection.Collection | None = None
 
 
-def get_openai() -> OpenAI:
+def get_openai() -> AsyncOpenAI:
+    """
+    Process-wide async client on the aiohttp transport (httpx's pool degrades
+    under concurrent load). Create it from inside the event loop, e.g. at startup.
+    """
     global _openai_client
     if _openai_client is None:
-        _openai_client = OpenAI() 
+        _openai_client = AsyncOpenAI(
+            http_client=DefaultAioHttpClient(), max_retries=2, timeout=30
+        )
     return _openai_client
 
 
@@ -56,17 +79,50 @@ def get_collection() -> chromadb.api.models.Collection.Collection:
     Get or create the persistent 'books' collection.
     We DO NOT register an embedding function with Chroma because
     we compute embeddings ourselves with OpenAI (so we can also use them elsewhere).
+    An existing collection is always kept as is: if its HNSW params differ from
+    HNSW_METADATA we only warn; init_store(force=True) rebuilds it.
     """
     global _collection
     if _collection is None:
         client = get_chroma_client()
-        _collection = client.get_or_create_collection(
-            name=COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"},  
-        )
+        try:
+            _collection = client.get_collection(name=COLLECTION_NAME)
+        except Exception:
+            _collection = client.create_collection(
+                name=COLLECTION_NAME,
+                metadata=HNSW_METADATA,
+            )
+        else:
+            _check_hnsw_params(_collection.metadata or {})
     return _collection
 
 
+def _check_hnsw_params(meta: Dict[str, Any]) -> None:
+    stale = {k: meta.get(k) for k in _HNSW_BUILD_KEYS if meta.get(k) != HNSW_METADATA[k]}
+    if stale:
+        wanted = {k: HNSW_METADATA[k] for k in stale}
+        print(
+            f"[rag] collection '{COLLECTION_NAME}' was built with {stale}, configured "
+            f"{wanted}; run `python -m app.setup_db --rebuild` to apply"
+        )
+    if meta.get("hnsw:search_ef") != HNSW_SEARCH_EF:
+        # Chroma 0.5 reads search_ef from the stored metadata and cannot change it
+        # in place (modify() replaces the whole dict and rejects hnsw:space).
+        print(
+            f"[rag] hnsw:search_ef is {meta.get('hnsw:search_ef')} in the store, "
+            f"HNSW_SEARCH_EF={HNSW_SEARCH_EF} applies after a rebuild"
+        )
+
+
+def _drop_collection() -> None:
+    global _collection
+    try:
+        get_chroma_client().delete_collection(name=COLLECTION_NAME)
+    except Exception:
+        pass
+    _collection = None
+
+
 # -----------------------------
 # Data loading & preprocessing
 # -----------------------------
@@ -120,40 +176,62 @@ def _compose_document(book: Dict[str, Any]) -> str:
 # -----------------------------
 
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBED_CACHE_SIZE = 2048
+EMBED_CONCURRENCY = 5
+# rows per collection.add: each call is one SQLite transaction + HNSW insert
+ADD_BATCH = 250
 
+# LRU: text -> embedding (tuple, so cached vectors can't be mutated by callers)
+_embed_cache: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+
+async def _embed_batch(texts: List[str]) -> List[List[float]]:
+    """One uncached embeddings call; vectors come back in the order of `texts`."""
+    resp = await get_openai().embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    return [item.embedding for item in resp.data]
+
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
     """
     Uses OpenAI embeddings API (batched by API).
     Returns list of float vectors in the same order as `texts`.
+    Texts seen recently are served from an in-process LRU; only the misses
+    go to the API, in a single batched call. Meant for queries: indexing goes
+    through _embed_batch so corpus documents don't evict query vectors.
     """
     if not texts:
         return []
-    client = get_openai()
-    resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
-    return [item.embedding for item in resp.data]  
+
+    unique = list(dict.fromkeys(texts))
+    # Snapshot hits before awaiting: a concurrent call may evict them meanwhile.
+    vectors = {t: _embed_cache[t] for t in unique if t in _embed_cache}
+    misses = [t for t in unique if t not in vectors]
+    if misses:
+        for text, vec in zip(misses, await _embed_batch(misses)):
+            vectors[text] = tuple(vec)
+
+    for text, vec in vectors.items():
+        _embed_cache[text] = vec
+        _embed_cache.move_to_end(text)
+    while len(_embed_cache) > EMBED_CACHE_SIZE:
+        _embed_cache.popitem(last=False)
+    return [list(vectors[t]) for t in texts]
 
 
 # -----------------------------
 # Indexing
 # -----------------------------
 
-def index_books(force: bool = False) -> Tuple[int, int]:
+async def index_books() -> Tuple[int, int]:
     """
     Build / refresh the Chroma index from local JSON.
     Returns (added, skipped).
-    If force=True, re-adds all docs (dedup by id first).
+    Only books whose id is not in the collection yet are embedded and added,
+    so re-runs cost no API calls. To re-embed everything, use init_store(force=True).
     """
     books = _load_books()
     col = get_collection()
 
-    existing_count = col.count() or 0
-    if existing_count and not force:
-        return (0, int(existing_count))
-
-    if force and existing_count:
-        col.delete(ids=col.get()["ids"]) 
-
     ids: List[str] = []
     docs: List[str] = []
     metas: List[Dict[str, Any]] = []
@@ -174,24 +252,47 @@ def index_books(force: bool = False) -> Tuple[int, int]:
             }
         )
 
+    existing = set(col.get(ids=ids, include=[])["ids"]) if ids else set()
+    if existing:
+        keep = [i for i, bid in enumerate(ids) if bid not in existing]
+        ids = [ids[i] for i in keep]
+        docs = [docs[i] for i in keep]
+        metas = [metas[i] for i in keep]
+
     BATCH = 64
+    batches = [(i, docs[i : i + BATCH]) for i in range(0, len(docs), BATCH)]
+    all_vectors: List[Optional[List[float]]] = [None] * len(docs)
+    sem = asyncio.Semaphore(EMBED_CONCURRENCY)
+
+    async def _run(i: int, chunk: List[str]) -> None:
+        async with sem:
+            # small jitter so concurrent batches don't hit the API as one burst (429s)
+            await asyncio.sleep(random.uniform(0, 0.05))
+            vecs = await _embed_batch(chunk)
+        all_vectors[i : i + len(chunk)] = vecs
+
+    await asyncio.gather(*[_run(i, chunk) for i, chunk in batches])
+
+    # Chroma's hnswlib segment keeps vectors as float32 whatever we pass in, so
+    # quantising to fp16/int8 here would only lose precision, not save memory.
     added = 0
-    for i in range(0, len(docs), BATCH):
-        batch_ids = ids[i : i + BATCH]
-        batch_docs = docs[i : i + BATCH]
-        batch_meta = metas[i : i + BATCH]
-        vectors = embed_texts(batch_docs)
-        col.add(ids=batch_ids, documents=batch_docs, embeddings=vectors, metadatas=batch_meta)
-        added += len(batch_ids)
+    for i in range(0, len(ids), ADD_BATCH):
+        col.add(
+            ids=ids[i : i + ADD_BATCH],
+            documents=docs[i : i + ADD_BATCH],
+            embeddings=all_vectors[i : i + ADD_BATCH],
+            metadatas=metas[i : i + ADD_BATCH],
+        )
+        added += len(ids[i : i + ADD_BATCH])
 
-    return (added, len(docs) - added)
+    return (added, len(existing))
 
 
 # -----------------------------
 # Retrieval
 # -----------------------------
 
-def retrieve(query: str, k: int = 3) -> List[Dict[str, Any]]:
+async def retrieve(query: str, k: int = 3) -> List[Dict[str, Any]]:
     """
     Returns top-k matches as a list of dicts:
     [
@@ -212,40 +313,37 @@ def retrieve(query: str, k: int = 3) -> List[Dict[str, Any]]:
 
     col = get_collection()
 
-    q_emb = embed_texts([query])[0]
-    res = col.query(query_embeddings=[q_emb], n_results=max(1, k))
-
-    out: List[Dict[str, Any]] = []
-    ids = res.get("ids", [[]])[0]
-    dists = res.get("distances", [[]])[0]
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
-
-    for i in range(len(ids)):
-        meta = metas[i] if i < len(metas) and isinstance(metas[i], dict) else {}
-        out.append(
-            {
-                "title": meta.get("title"),
-                "summary": meta.get("summary"),
-                "authors": meta.get("authors", []),
-                "tags": meta.get("tags", []),
-                "distance": dists[i] if i < len(dists) else None,
-                "document": docs[i] if i < len(docs) else None,
-                "id": ids[i],
-            }
-        )
-    return out
+    q_emb = (await embed_texts([query]))[0]
+    # HNSW search is blocking native code; keep it off the event loop.
+    res = await asyncio.to_thread(col.query, query_embeddings=[q_emb], n_results=max(1, k))
+
+    ids, dists, docs, metas = (res[key][0] for key in ("ids", "distances", "documents", "metadatas"))
+    return [
+        {
+            "title": m.get("title"),
+            "summary": m.get("summary"),
+            "authors": m.get("authors", []),
+            "tags": m.get("tags", []),
+            "distance": d,
+            "document": doc,
+            "id": i_,
+        }
+        for i_, d, doc, m in zip(ids, dists, docs, (m or {} for m in metas))
+    ]
 
 
 # -----------------------------
 # Convenience init on import 
 # -----------------------------
 
-def init_store(force: bool = False) -> Tuple[int, int]:
+async def init_store(force: bool = False) -> Tuple[int, int]:
     """
     Ensure the store exists and is populated.
     Call this once at app startup (e.g., in FastAPI lifespan event).
+    If force=True, drops the collection and rebuilds it with the current
+    HNSW_METADATA (re-embeds every book).
     """
-    get_collection() 
-    return index_books(force=force)
-
+    if force:
+        _drop_collection()
+    get_collection()
+    return await index_books()
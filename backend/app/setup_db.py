@@ -1,40 +1,27 @@
-import json
-import chromadb
-from chromadb.config import Settings
-import openai
-import os
+"""
+Populează colecția Chroma folosită de backend (același store ca rag.py, la CHROMA_DIR).
+
+Rulare (din backend/):
+    python -m app.setup_db            # adaugă doar cărțile lipsă
+    python -m app.setup_db --rebuild  # șterge colecția și o reconstruiește cu HNSW_METADATA curent
+"""
+import asyncio
+import sys
+
 from dotenv import load_dotenv
 
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
-
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
-BOOKS_PATH = os.path.join(DATA_DIR, "book_summaries.json")
-
-with open(BOOKS_PATH, "r", encoding="utf-8") as f:
-    books = json.load(f)
-
-client = chromadb.Client(Settings(persist_directory="./chroma_db"))
-collection = client.get_or_create_collection("books")
-
-def get_embedding(text):
-    response = openai.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    return response.data[0].embedding
-
-for book in books:
-    embedding = get_embedding(book["summary"])
-    collection.add(
-        documents=[book["summary"]],
-        embeddings=[embedding],
-        metadatas=[{
-            "title": book["title"],
-            "authors": ", ".join(book.get("authors", [])), 
-            "tags": ", ".join(book.get("tags", []))         
-        }],
-        ids=[book["title"]]
-    )
-
-print("Baza de date ChromaDB a fost populată cu rezumate, embeddings")
+
+from .rag import CHROMA_DIR, get_openai, init_store
+
+
+async def main(rebuild: bool = False) -> None:
+    try:
+        added, skipped = await init_store(force=rebuild)
+    finally:
+        await get_openai().close()
+    print(f"Baza de date ChromaDB ({CHROMA_DIR}) e gata: added={added}, skipped={skipped}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(rebuild="--rebuild" in sys.argv[1:]))
@@ -12,14 +12,26 @@ Data source: backend/app/data/book_summaries.json
 
 from __future__ import annotations
 
-import json
+import bisect
+import functools
 import pathlib
-from typing import Any, Dict, List, Optional
+import threading
 from difflib import get_close_matches
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from openai import pydantic_function_tool
 
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    process = None
+
 # -----------------------------
 # Paths & data loading
 # -----------------------------
@@ -32,31 +44,97 @@ BOOKS_JSON = DATA_DIR / "book_summaries.json"
 def _load_books() -> List[Dict[str, Any]]:
     if not BOOKS_JSON.exists():
         raise FileNotFoundError(f"books file not found: {BOOKS_JSON}")
-    with open(BOOKS_JSON, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = _loads(BOOKS_JSON.read_bytes())
     if not isinstance(data, list):
         raise ValueError("book_summaries.json must contain a list of books")
     return data
 
 
 def _norm(s: str) -> str:
-    return (s or "").strip().casefold()
+    s = (s or "").strip()
+    # pe ASCII lower() și casefold() coincid, iar lower() e mai ieftin
+    return s.lower() if s.isascii() else s.casefold()
 
 
 _BOOKS_CACHE: Optional[List[Dict[str, Any]]] = None
 _TITLE_INDEX: Optional[Dict[str, Dict[str, Any]]] = None
+# SoA: cheile normalizate și cărțile lor, în liste paralele (același index)
+_TITLE_LIST: List[str] = []
+_BOOK_LIST: List[Dict[str, Any]] = []
+_SORTED_KEYS: List[str] = []
+# toate cheile lipite cu "\0" + offset-ul de start al fiecăreia (aliniate cu _TITLE_LIST)
+_KEY_HAYSTACK = ""
+_KEY_OFFSETS: List[int] = []
+
+
+_CACHE_LOCK = threading.Lock()
 
 
 def _ensure_cache() -> None:
-    global _BOOKS_CACHE, _TITLE_INDEX
-    if _BOOKS_CACHE is None or _TITLE_INDEX is None:
-        books = _load_books()
-        _BOOKS_CACHE = books
-        _TITLE_INDEX = {}
-        for b in books:
-            title = str(b.get("title", "")).strip()
-            if title:
-                _TITLE_INDEX[_norm(title)] = b
+    # double-checked: fără lock după prima încărcare; două thread-uri nu pot
+    # încărca fișierul în paralel la primul apel
+    if _TITLE_INDEX is not None:
+        return
+    with _CACHE_LOCK:
+        if _TITLE_INDEX is None:
+            _build_cache()
+
+
+def _build_cache() -> None:
+    global _BOOKS_CACHE, _TITLE_INDEX, _TITLE_LIST, _BOOK_LIST, _SORTED_KEYS
+    global _KEY_HAYSTACK, _KEY_OFFSETS
+    books = _load_books()
+    for b in books:
+        # câmpuri derivate, calculate o dată: pe hot path doar le citim
+        b["_title"] = str(b.get("title", "")).strip()
+        b["_summary"] = str(b.get("summary") or "").strip()
+        b["_key"] = _norm(b["_title"])
+    index = {b["_key"]: b for b in books if b["_key"]}
+    _BOOKS_CACHE = books
+    _TITLE_LIST = list(index)
+    _BOOK_LIST = list(index.values())
+    _SORTED_KEYS = sorted(_TITLE_LIST)
+    offsets, pos = [], 0
+    for k in _TITLE_LIST:
+        offsets.append(pos)
+        pos += len(k) + 1
+    _KEY_OFFSETS = offsets
+    _KEY_HAYSTACK = "\0".join(_TITLE_LIST)
+    # ultimul: _ensure_cache îl folosește ca semnal că totul e gata
+    _TITLE_INDEX = index
+    _summary_for_key.cache_clear()
+
+
+def _find_partial(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Cartea al cărei titlu începe cu `key` (bisect pe cheile sortate);
+    altfel prima care conține `key` ca subșir — un singur str.find peste toate
+    cheile, nu câte un `in` per titlu.
+    """
+    i = bisect.bisect_left(_SORTED_KEYS, key)
+    if i < len(_SORTED_KEYS) and _SORTED_KEYS[i].startswith(key):
+        return _TITLE_INDEX[_SORTED_KEYS[i]]
+    if "\0" in key:
+        return None
+    pos = _KEY_HAYSTACK.find(key)
+    if pos < 0:
+        return None
+    return _BOOK_LIST[bisect.bisect_right(_KEY_OFFSETS, pos) - 1]
+
+
+def _closest_key(key: str) -> Optional[str]:
+    """
+    Cea mai apropiată cheie de titlu (rapidfuzz). Fără rapidfuzz: difflib, dar doar
+    pe titlurile a căror lungime permite un ratio >= cutoff (2·min / suma lungimilor,
+    aceeași limită ca real_quick_ratio) — celelalte nu pot trece de cutoff.
+    """
+    if process is not None:
+        close = process.extractOne(key, _TITLE_LIST, scorer=fuzz.WRatio, score_cutoff=60)
+        return close[0] if close else None
+    n = len(key)
+    pool = [t for t in _TITLE_LIST if 2 * min(len(t), n) >= 0.6 * (len(t) + n)]
+    close = get_close_matches(key, pool, n=1, cutoff=0.6)
+    return close[0] if close else None
 
 
 # -----------------------------
@@ -70,110 +148,108 @@ def get_summary_by_title(title: str) -> str:
     if not title or not title.strip():
         return "Nu am primit niciun titlu. Te rog trimite un titlu de carte valid."
 
-    key = _norm(title)
-
-    if key in _TITLE_INDEX:
-        book = _TITLE_INDEX[key]
-        summary = str(book.get("summary") or "").strip()
-        if summary:
-            return summary
-        return f"Cartea „{book.get('title','(fără titlu)')}” nu are un rezumat disponibil."
-
-    candidates = [b for tkey, b in _TITLE_INDEX.items() if key in tkey or tkey.startswith(key)]
-    if not candidates:
-        all_titles = [b.get("title", "") for b in _BOOKS_CACHE]
-        close = get_close_matches(title, all_titles, n=1, cutoff=0.6)
-        if close:
-            close_title = close[0]
-            book = _TITLE_INDEX[_norm(close_title)]
-            summary = str(book.get("summary") or "").strip()
-            if summary:
-                return summary
-            return f"Am găsit cartea cea mai apropiată „{close_title}”, dar nu are rezumat."
+    found = _summary_for_key(_norm(title))
+    if found is None:
         return f"Nu am găsit nicio carte cu titlul „{title}”."
+    return found
+
+
+@functools.lru_cache(maxsize=256)
+def _summary_for_key(key: str) -> Optional[str]:
+    """
+    Răspunsul pentru o cheie normalizată (exact → prefix/subșir → fuzzy), memorat
+    per cheie; None dacă nu există nicio potrivire. Golit la reîncărcarea cache-ului.
+    """
+    book = _TITLE_INDEX.get(key)
+    if book is not None:
+        if book["_summary"]:
+            return book["_summary"]
+        return f"Cartea „{book['_title'] or '(fără titlu)'}” nu are un rezumat disponibil."
+
+    best = _find_partial(key)
+    if best is None:
+        close = _closest_key(key)
+        if close:
+            book = _TITLE_INDEX[close]
+            if book["_summary"]:
+                return book["_summary"]
+            return f"Am găsit cartea cea mai apropiată „{book['_title']}”, dar nu are rezumat."
+        return None
 
-    best = candidates[0]
-    summary = str(best.get("summary") or "").strip()
-    if summary:
-        return summary
-    return f"Cartea „{best.get('title','(necunoscut)')}” nu are rezumat disponibil."
+    if best["_summary"]:
+        return best["_summary"]
+    return f"Cartea „{best['_title'] or '(necunoscut)'}” nu are rezumat disponibil."
 
 
 # -----------------------------
 # Responses tool schema
 # -----------------------------
-from pydantic import BaseModel
-from openai import pydantic_function_tool
 
 class GetSummaryArgs(BaseModel):
-    title: str
+    title: str = Field(..., description="Titlul exact sau aproximativ al cărții.")
 
 def _tool_get_summary_by_title(args: GetSummaryArgs) -> str:
     return get_summary_by_title(args.title)
 
+# Schema (strict) generată din modelul Pydantic, ca să nu poată diverge de el.
+_TOOLS: list[dict] = [
+    pydantic_function_tool(
+        GetSummaryArgs,
+        name="get_summary_by_title",
+        description=(
+            "Returnează rezumatul complet al unei cărți din colecția locală, "
+            "identificată prin titlu (case-insensitive, toleranță la mici greșeli)."
+        ),
+    )
+]
+
+
 def get_tools() -> list[dict]:
-    return [
-        {
-            "type": "function",
-            "function": {
-                "name": "get_summary_by_title",
-                "description": (
-                    "Returnează rezumatul complet al unei cărți din colecția locală, "
-                    "identificată prin titlu (case-insensitive, toleranță la mici greșeli)."
-                ),
-                "strict": True,
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "title": {
-                            "type": "string",
-                            "description": "Titlul exact sau aproximativ al cărții."
-                        }
-                    },
-                    "required": ["title"],
-                    "additionalProperties": False
-                },
-            },
-        }
-    ]
+    """Schema construită o dată la import; nu o modifica pe loc."""
+    return _TOOLS
 
 # -----------------------------
 # Helper pentru tool_outputs
 # -----------------------------
 
+# nume tool -> (model Pydantic al argumentelor, funcție(args) -> str); un tool nou = o intrare aici
+_TOOL_FUNCS: Dict[str, Tuple[Type[BaseModel], Callable[[Any], str]]] = {
+    "get_summary_by_title": (GetSummaryArgs, _tool_get_summary_by_title),
+}
+
+
+def _run_tool_call(name: Optional[str], raw_args: Any) -> str:
+    entry = _TOOL_FUNCS.get(name or "")
+    if entry is None:
+        return f"Eroare: funcție necunoscută '{name}'."
+    args_model, fn = entry
+    try:
+        # JSON-ul vine parsat și validat direct de pydantic-core, fără dict intermediar
+        if isinstance(raw_args, str) and raw_args.strip():
+            args = args_model.model_validate_json(raw_args)
+        else:
+            args = args_model.model_validate(raw_args if isinstance(raw_args, dict) else {})
+        return fn(args)
+    except Exception as e:
+        return f"Eroare la executarea funcției '{name}': {e}"
+
+
 def build_tool_outputs(required_action: Dict[str, Any]) -> List[Dict[str, str]]:
     if not required_action or required_action.get("type") != "submit_tool_outputs":
         return []
 
     tool_calls = required_action.get("submit_tool_outputs", {}).get("tool_calls") or []
-    outputs: List[Dict[str, str]] = []
-
-    for call in tool_calls:
-        call_id = call.get("id")
-        fn = (call.get("function") or {})
-        name = fn.get("name")
-        raw_args = fn.get("arguments")
-
-        output_str = "Eroare: nu am putut executa funcția."
-        try:
-            if isinstance(raw_args, dict):
-                args = raw_args
-            elif isinstance(raw_args, str) and raw_args.strip():
-                args = json.loads(raw_args)
-            else:
-                args = {}
-
-            if name == "get_summary_by_title":
-                output_str = get_summary_by_title(str(args.get("title", "")))
-            else:
-                output_str = f"Eroare: funcție necunoscută '{name}'."
-        except Exception as e:
-            output_str = f"Eroare la executarea funcției '{name}': {e}"
-
-        if call_id:
-            outputs.append({"tool_call_id": call_id, "output": output_str})
-
-    return outputs
+    return [
+        {
+            "tool_call_id": call["id"],
+            "output": _run_tool_call(
+                (call.get("function") or {}).get("name"),
+                (call.get("function") or {}).get("arguments"),
+            ),
+        }
+        for call in tool_calls
+        if call.get("id")
+    ]
 
 
 def list_titles() -> List[str]:
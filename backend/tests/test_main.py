@@ -0,0 +1,126 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app import main
+from app.main import PreparedContext, _match_title, _parse_title_line, _split_preamble
+
+TITLES = ["A", "B"]
+
+
+def test_parse_title_line_reads_preamble():
+    assert _parse_title_line('{"title":"B"}') == "B"
+    assert _parse_title_line('  {"title": " C "}  ') == "C"
+
+
+def test_parse_title_line_rejects_other_input():
+    assert _parse_title_line("Îți recomand B.") is None
+    assert _parse_title_line('["B"]') is None
+    assert _parse_title_line('{"titlu":"B"}') is None
+
+
+def test_match_title_ignores_case():
+    assert _match_title("b", TITLES) == "B"
+    assert _match_title(" A ", TITLES) == "A"
+    assert _match_title("C", TITLES) is None
+    assert _match_title("", TITLES) is None
+
+
+def test_split_preamble_plain():
+    assert _split_preamble('{"title":"B"}\nText', TITLES) == ("B", "Text")
+
+
+def test_split_preamble_waits_for_full_line():
+    assert _split_preamble('{"title":', TITLES) is None
+    assert _split_preamble('\n{"title":"B"}', TITLES) is None
+
+
+def test_split_preamble_skips_leading_blank_lines():
+    assert _split_preamble('\n\n{"title":"B"}\n\nText', TITLES) == ("B", "Text")
+
+
+def test_split_preamble_skips_fences():
+    head = '```json\n{"title":"B"}\n```\nText'
+    assert _split_preamble(head, TITLES) == ("B", "Text")
+    # gardul de închidere încă n-a sosit
+    assert _split_preamble('```json\n{"title":"B"}\n', TITLES) is None
+
+
+def test_split_preamble_drops_unknown_title_line():
+    assert _split_preamble('{"title":"C"}\nText', TITLES) == (None, "Text")
+
+
+def test_split_preamble_without_preamble_keeps_text():
+    assert _split_preamble("Îți recomand B.\nPentru că", TITLES) == (None, "Îți recomand B.\nPentru că")
+
+
+def test_split_preamble_done_decides_on_partial_input():
+    assert _split_preamble('{"title":"A"}', TITLES, done=True) == ("A", "")
+    assert _split_preamble("Text", TITLES, done=True) == (None, "Text")
+
+
+class _FakeStream:
+    def __init__(self, deltas):
+        self._events = [SimpleNamespace(type="response.output_text.delta", delta=d) for d in deltas]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for e in self._events:
+            yield e
+
+
+def _run_stream(deltas):
+    client = SimpleNamespace(responses=SimpleNamespace(stream=lambda **kw: _FakeStream(deltas)))
+    ctx = PreparedContext(
+        items=[{"title": t} for t in TITLES],
+        titles=TITLES,
+        rag_block="—",
+        summaries_by_title={"A": "rezumat A", "B": "rezumat B"},
+    )
+
+    async def collect():
+        return [c async for c in main._stream_final_with_summary(client, "mesaj", ctx)]
+
+    frames = [f.decode("utf-8") for f in asyncio.run(collect())]
+    text = "".join(
+        "\n".join(line[len("data: "):] for line in f.splitlines() if line.startswith("data: "))
+        for f in frames
+        if f.startswith("event: token")
+    )
+    final = json.loads(frames[-1].split("data: ", 1)[1])
+    return text, final
+
+
+def test_stream_hides_preamble_after_blank_line():
+    text, final = _run_stream(['\n{"title":"B"}\nText'])
+    assert text == "Text"
+    assert final["recommendation"] == {"title": "B"}
+    assert final["summary"] == "rezumat B"
+
+
+def test_stream_without_preamble_sends_no_recommendation():
+    text, final = _run_stream(["Îți recomand B", ".\nPentru că..."])
+    assert text == "Îți recomand B.\nPentru că..."
+    assert final["recommendation"] is None
+    assert final["summary"] is None
+
+
+def test_stream_hides_preamble_with_differently_cased_title():
+    text, final = _run_stream(['{"title":"b"}\nÎți recomand B.'])
+    assert text == "Îți recomand B."
+    assert final["recommendation"] == {"title": "B"}
+    assert final["summary"] == "rezumat B"
+
+
+def test_stream_hides_preamble_with_unknown_title():
+    text, final = _run_stream(['{"title":"C"}\nÎți recomand C.'])
+    assert text == "Îți recomand C."
+    assert final["recommendation"] is None
@@ -0,0 +1,28 @@
+import pytest
+
+from app import moderation
+from app.moderation import is_offensive
+
+
+def test_hyperscan_db_compiles_when_installed():
+    pytest.importorskip("hyperscan")
+    assert moderation._HS_DB is not None
+
+
+@pytest.mark.parametrize(
+    "text, term",
+    [
+        ("Ești un IDIOT", "idiot"),
+        ("ce țigănie", None),
+        ("nu mai fi țigan", "țigan"),
+        ("Doamne-ferește", "doamne-ferește"),
+    ],
+)
+def test_is_offensive_finds_whole_words(text, term):
+    assert is_offensive(text) == term
+
+
+def test_is_offensive_ignores_stems_inside_words():
+    # „cur” apare în „scurtă”, dar nu la început de cuvânt
+    assert is_offensive("Vreau o carte scurtă de aventuri") is None
+    assert is_offensive("") is None
@@ -0,0 +1,29 @@
+import asyncio
+
+from app import rag
+
+
+async def _fake_embed_batch(texts):
+    return [[float(len(t)), 1.0, 0.0, 0.5] for t in texts]
+
+
+def test_rebuild_applies_configured_hnsw_params(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(rag, "CHROMA_DIR", tmp_path)
+    monkeypatch.setattr(rag, "_chroma_client", None)
+    monkeypatch.setattr(rag, "_collection", None)
+    monkeypatch.setattr(rag, "_embed_batch", _fake_embed_batch)
+    # a non-default search_ef, as if it came from .env
+    monkeypatch.setattr(rag, "HNSW_SEARCH_EF", 20)
+    monkeypatch.setitem(rag.HNSW_METADATA, "hnsw:search_ef", 20)
+
+    added, skipped = asyncio.run(rag.init_store(force=True))
+    assert added > 0 and skipped == 0
+
+    # a fresh start reopens the rebuilt collection and has nothing to warn about
+    monkeypatch.setattr(rag, "_collection", None)
+    capsys.readouterr()
+    rag.get_collection()
+    assert "[rag]" not in capsys.readouterr().out
+
+    rag._check_hnsw_params({"hnsw:space": "cosine"})
+    assert "[rag]" in capsys.readouterr().out
@@ -0,0 +1,15 @@
+from app import tools
+
+
+def test_difflib_fallback_matches_shortened_title(monkeypatch):
+    # fără rapidfuzz: titlul scurtat trebuie să treacă de filtrul de lungime
+    monkeypatch.setattr(tools, "process", None)
+    tools._summary_for_key.cache_clear()
+    try:
+        summary = tools.get_summary_by_title("Cronicile din Narnia Leul")
+    finally:
+        tools._summary_for_key.cache_clear()
+    assert summary == tools._TITLE_INDEX[
+        tools._norm("Cronicile din Narnia: Leul, Vrăjitoarea și Dulapul")
+    ]["_summary"]
+